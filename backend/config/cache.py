@@ -3,18 +3,46 @@ Cache Control Middleware - Agrega headers HTTP Cache-Control automáticamente
 según el tipo de endpoint y su método HTTP
 """
 
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from functools import lru_cache
+from typing import Optional
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Valores de Cache-Control pre-codificados: se agregan tal cual a los headers ASGI
+_CC_NO_STORE = b"no-cache, no-store, must-revalidate"
+_CC_ASSETS = b"public, max-age=31536000, immutable"
+_CC_NOTES = b"public, max-age=300"
+_CC_TAGS = b"public, max-age=600"
+_CC_GRAPH = b"public, max-age=600"
+_CC_API_DEFAULT = b"public, max-age=60"
 
-class CacheControlMiddleware(BaseHTTPMiddleware):
+# Métodos que modifican estado: nunca se cachean en el navegador
+_WRITE_METHODS = frozenset({"POST", "PUT", "DELETE", "PATCH"})
+
+# Cache-Control por prefijo para GET, indexado por el primer segmento del path
+# ("assets") o por los dos primeros ("api/notes")
+_GET_PREFIX_MAP = {
+    # Static assets - cachear por 1 año
+    "assets": _CC_ASSETS,
+    # Notes - cachear 5 minutos
+    "api/notes": _CC_NOTES,
+    # Tags - cachear 10 minutos
+    "api/tags": _CC_TAGS,
+    # Graph - cachear 10 minutos
+    "api/graph": _CC_GRAPH,
+}
+
+
+class CacheControlMiddleware:
     """
-    Middleware que agrega headers Cache-Control automáticamente.
-    
+    Middleware ASGI puro que agrega headers Cache-Control automáticamente.
+
+    Solo intercepta el mensaje ``http.response.start`` y modifica su lista de
+    headers in-place; el resto de mensajes se reenvían sin tocar. Evita el
+    task group y el buffering por request de ``BaseHTTPMiddleware``.
+
     Estrategia:
     - GET /api/notes/* → Cache-Control: max-age=300 (5 min)
     - GET /api/tags → Cache-Control: max-age=600 (10 min)
@@ -22,61 +50,71 @@ class CacheControlMiddleware(BaseHTTPMiddleware):
     - POST/PUT/DELETE → Cache-Control: no-cache
     - Assets → Cache-Control: max-age=31536000 (1 año)
     """
-    
-    async def dispatch(self, request: Request, call_next) -> Response:
-        response = await call_next(request)
-        
-        # No modificar si ya tiene Cache-Control header
-        if "cache-control" in response.headers:
-            return response
-        
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
         # Obtener path y método
-        path = request.url.path
-        method = request.method
-        
-        # Determinar cache strategy basado en path y método
-        cache_control = self._get_cache_control(path, method)
-        
-        if cache_control:
-            response.headers["Cache-Control"] = cache_control
-            logger.debug(f"[Cache] {method} {path} → {cache_control}")
-        
-        return response
-    
+        path = scope["path"]
+        method = scope["method"]
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = message.setdefault("headers", [])
+
+                # No modificar si ya tiene Cache-Control header
+                if not any(name.lower() == b"cache-control" for name, _ in headers):
+                    # Determinar cache strategy basado en path y método
+                    cache_control = self._get_cache_control(path, method)
+
+                    if cache_control:
+                        headers.append((b"cache-control", cache_control))
+                        logger.debug("[Cache] %s %s → %s", method, path, cache_control)
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
     @staticmethod
-    def _get_cache_control(path: str, method: str) -> str:
+    def _get_cache_control(path: str, method: str) -> Optional[bytes]:
         """
         Determinar Cache-Control header basado en path y método.
-        
+
+        El path se reduce a sus dos primeros segmentos (``/api/notes/...`` →
+        ``/api/notes``) para que la caché LRU no crezca con cada nota.
+
         Returns:
-            String con el valor de Cache-Control o None
+            Valor de Cache-Control ya codificado en bytes o None
         """
-        
-        # PUT, POST, DELETE → no cachear en navegador
-        if method in ["POST", "PUT", "DELETE", "PATCH"]:
-            return "no-cache, no-store, must-revalidate"
-        
-        # GET requests - según el endpoint
-        if method == "GET":
-            # Static assets - cachear por 1 año
-            if path.startswith("/assets/"):
-                return "public, max-age=31536000, immutable"
-            
-            # Notes - cachear 5 minutos
-            if path.startswith("/api/notes"):
-                return "public, max-age=300"
-            
-            # Tags - cachear 10 minutos
-            if path.startswith("/api/tags"):
-                return "public, max-age=600"
-            
-            # Graph - cachear 10 minutos
-            if path.startswith("/api/graph"):
-                return "public, max-age=600"
-            
-            # Default para otros GETs - cachear 1 minuto
-            if path.startswith("/api/"):
-                return "public, max-age=60"
-        
-        # Sin cache para otros requests
-        return None
+        prefix = "/".join(path.split("/", 3)[:3])
+        return _cache_control_for(method, prefix)
+
+
+@lru_cache(maxsize=1024)
+def _cache_control_for(method: str, prefix: str) -> Optional[bytes]:
+    """Resolver Cache-Control para un (método, prefijo de path), cacheado"""
+
+    # PUT, POST, DELETE → no cachear en navegador
+    if method in _WRITE_METHODS:
+        return _CC_NO_STORE
+
+    # GET requests - según el endpoint (un solo split + lookup en dict)
+    if method == "GET":
+        parts = prefix.split("/")
+
+        # Solo paths con al menos "/<segmento>/": "/assets" sin barra final o
+        # paths sin "/" (p. ej. "*") no se cachean
+        if len(parts) > 2:
+            if parts[1] in _GET_PREFIX_MAP:
+                return _GET_PREFIX_MAP[parts[1]]
+
+            # Default para otros GETs bajo /api/ - cachear 1 minuto
+            if parts[1] == "api":
+                return _GET_PREFIX_MAP.get(f"api/{parts[2]}", _CC_API_DEFAULT)
+
+    # Sin cache para otros requests
+    return None
@@ -0,0 +1,29 @@
+"""
+CORS Middleware con fast path - Evita el procesamiento CORS en requests
+que no traen header Origin (health checks, llamadas server-to-server)
+"""
+
+from starlette.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class FastPathCORSMiddleware:
+    """
+    Envoltorio ASGI sobre ``CORSMiddleware``.
+
+    Solo delega en CORS cuando el request trae ``Origin``; el resto va directo
+    a la app sin construir ``Headers`` ni recorrer la configuración CORS.
+    Acepta los mismos argumentos que ``CORSMiddleware``.
+    """
+
+    def __init__(self, app: ASGIApp, **cors_options):
+        self.app = app
+        self.cors = CORSMiddleware(app, **cors_options)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            for name, _ in scope["headers"]:
+                if name == b"origin":
+                    return await self.cors(scope, receive, send)
+        # Sin Origin (o no-HTTP): CORSMiddleware tampoco haría nada
+        await self.app(scope, receive, send)
@@ -4,10 +4,15 @@ Proporciona un logger configurado que registra en consola y archivos
 """
 
 import logging
+import logging.handlers
+import queue
 import sys
 from pathlib import Path
 from typing import Optional
 
+# Listener en segundo plano que escribe los registros encolados (consola y archivos)
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+
 
 def setup_logging(log_level: str = "INFO", log_dir: Optional[Path] = None) -> logging.Logger:
     """
@@ -31,9 +36,13 @@ def setup_logging(log_level: str = "INFO", log_dir: Optional[Path] = None) -> lo
     logger = logging.getLogger("realm_keeper")
     logger.setLevel(getattr(logging, log_level))
     
-    # Evitar duplicados si ya hay handlers
+    # Reutilizar el logger si ya fue configurado (tests, reload) para no
+    # duplicar handlers ni dejar file descriptors abiertos
     if logger.handlers:
-        logger.handlers.clear()
+        return logger
+    
+    # No re-emitir los registros en el root logger
+    logger.propagate = False
     
     # Formato de log
     formatter = logging.Formatter(
@@ -45,7 +54,7 @@ def setup_logging(log_level: str = "INFO", log_dir: Optional[Path] = None) -> lo
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(getattr(logging, log_level))
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
     
     # Handler para archivo (solo en DEBUG o si log_dir especificado)
     if log_dir:
@@ -53,21 +62,56 @@ def setup_logging(log_level: str = "INFO", log_dir: Optional[Path] = None) -> lo
         
         # Archivo principal de la aplicación
         app_log_file = log_dir / "app.log"
-        file_handler = logging.FileHandler(app_log_file)
+        # Rotación para acotar el disco; delay=True abre el archivo en el primer emit
+        file_handler = logging.handlers.RotatingFileHandler(
+            app_log_file, maxBytes=10_000_000, backupCount=3, delay=True
+        )
         file_handler.setLevel(getattr(logging, log_level))
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
         
         # Archivo de errores separado
         error_log_file = log_dir / "error.log"
-        error_handler = logging.FileHandler(error_log_file)
+        error_handler = logging.handlers.RotatingFileHandler(
+            error_log_file, maxBytes=10_000_000, backupCount=3, delay=True
+        )
         error_handler.setLevel(logging.ERROR)
         error_handler.setFormatter(formatter)
-        logger.addHandler(error_handler)
+        handlers.append(error_handler)
+    
+    # El event loop solo encola; la escritura a consola/disco ocurre en el
+    # hilo del QueueListener para no bloquear requests con I/O
+    global _queue_listener
+    log_queue: queue.Queue = queue.Queue(-1)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _queue_listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _queue_listener.start()
     
     return logger
 
 
+def stop_logging() -> None:
+    """
+    Detener el QueueListener vaciando los registros pendientes.
+    Los handlers reales pasan al logger para que los mensajes posteriores
+    al shutdown se sigan escribiendo (de forma síncrona).
+    """
+    global _queue_listener
+    if _queue_listener is None:
+        return
+    
+    _queue_listener.stop()
+    logger = logging.getLogger("realm_keeper")
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    for handler in _queue_listener.handlers:
+        logger.addHandler(handler)
+    _queue_listener = None
+
+
 def get_logger(name: str) -> logging.Logger:
     """
     Obtener un logger con nombre específico (para módulos)
@@ -5,74 +5,109 @@ Maneja todas las variables de entorno y configuración de la aplicación
 
 import os
 import logging
+from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Optional
 
 
+@dataclass(frozen=True, slots=True)
 class Settings:
-    """Configuración centralizada del backend"""
+    """
+    Configuración centralizada del backend.
+
+    Inmutable y con slots: se construye una sola vez desde el entorno con
+    ``Settings.from_env()`` y cada acceso ``settings.FOO`` es una lectura de slot.
+    """
 
     # ============================================================
     # VAULT CONFIGURATION
     # ============================================================
-    VAULT_PATH: Path = Path(os.getenv("VAULT_PATH", "/app/vault"))
-    REPO_URL: Optional[str] = os.getenv("REPO_URL", None)
-    VAULT_SYNC_INTERVAL: int = int(os.getenv("VAULT_SYNC_INTERVAL", "3600"))  # Default: 1 hour
-    NOTE_TAG_IGNORE: str = os.getenv("NOTE_TAG_IGNORE", "draft")
+    VAULT_PATH: Path
+    REPO_URL: Optional[str]
+    VAULT_SYNC_INTERVAL: int  # Default: 1 hour
+    NOTE_TAG_IGNORE: str
 
     # ============================================================
     # API CONFIGURATION
     # ============================================================
-    CORS_ALLOWED_ORIGINS: List[str] = [
-        origin.strip()
-        for origin in os.getenv(
-            "CORS_ALLOWED_ORIGINS", "http://localhost:5173"
-        ).split(",")
-    ]
-    API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
-    API_PORT: int = int(os.getenv("API_PORT", "8000"))
+    CORS_ALLOWED_ORIGINS: List[str]
+    API_HOST: str
+    API_PORT: int
 
     # ============================================================
     # LIGHTRAG CONFIGURATION
     # ============================================================
-    LIGHTRAG_WORKING_DIR: Path = Path(
-        os.getenv("LIGHTRAG_WORKING_DIR", "/app/rag_storage")
-    )
-    OLLAMA_HOST: str = os.getenv("OLLAMA_HOST", "http://ollama:11434")
-    LLM_MODEL: str = os.getenv("LLM_MODEL", "llama3.2")
-    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
-    EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", "768"))
-    LLM_CONTEXT_SIZE: int = int(os.getenv("LLM_CONTEXT_SIZE", "32768"))
+    LIGHTRAG_WORKING_DIR: Path
+    OLLAMA_HOST: str
+    LLM_MODEL: str
+    EMBEDDING_MODEL: str
+    EMBEDDING_DIM: int
+    LLM_CONTEXT_SIZE: int
+    INDEX_CONCURRENCY: int  # Documents indexed in parallel
 
     # ============================================================
     # TIMEOUT CONFIGURATION (in seconds)
     # ============================================================
-    LLM_TIMEOUT: int = int(os.getenv("LLM_TIMEOUT", "600"))  # 10 min
-    EMBED_TIMEOUT: int = int(os.getenv("EMBED_TIMEOUT", "120"))  # 2 min
-    QUERY_TIMEOUT: int = int(os.getenv("QUERY_TIMEOUT", "300"))  # 5 min
+    LLM_TIMEOUT: int  # 10 min
+    EMBED_TIMEOUT: int  # 2 min
+    QUERY_TIMEOUT: int  # 5 min
 
     # ============================================================
-    # LIMITS & CONSTRAINTS
+    # LOGGING CONFIGURATION
     # ============================================================
-    MAX_STREAM_CHUNKS: int = 10000
-    MAX_NOTES_PER_REQUEST: int = 500
-    QUERY_MAX_RETRIES: int = 3
-    MARKDOWN_CACHE_TTL: int = 300  # 5 minutes
+    LOG_LEVEL: str
+    LOG_DIR: Path
 
     # ============================================================
-    # LOGGING CONFIGURATION
+    # RATE LIMITING
     # ============================================================
-    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
-    LOG_DIR: Path = Path(os.getenv("LOG_DIR", "/app/logs"))
+    RATE_LIMIT_ENABLED: bool
+    RATE_LIMIT_REQUESTS: int
+    RATE_LIMIT_WINDOW: int  # seconds
 
     # ============================================================
-    # RATE LIMITING
+    # LIMITS & CONSTRAINTS
     # ============================================================
-    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
-    RATE_LIMIT_REQUESTS: int = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
-    RATE_LIMIT_WINDOW: int = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # seconds
+    MAX_STREAM_CHUNKS: int = 10000
+    MAX_NOTES_PER_REQUEST: int = 500
+    QUERY_MAX_RETRIES: int = 3
 
-    def __init__(self):
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Construir la configuración leyendo las variables de entorno"""
+        return cls(
+            VAULT_PATH=Path(os.getenv("VAULT_PATH", "/app/vault")),
+            REPO_URL=os.getenv("REPO_URL", None),
+            VAULT_SYNC_INTERVAL=int(os.getenv("VAULT_SYNC_INTERVAL", "3600")),
+            NOTE_TAG_IGNORE=os.getenv("NOTE_TAG_IGNORE", "draft"),
+            CORS_ALLOWED_ORIGINS=[
+                origin.strip()
+                for origin in os.getenv(
+                    "CORS_ALLOWED_ORIGINS", "http://localhost:5173"
+                ).split(",")
+            ],
+            API_HOST=os.getenv("API_HOST", "0.0.0.0"),
+            API_PORT=int(os.getenv("API_PORT", "8000")),
+            LIGHTRAG_WORKING_DIR=Path(
+                os.getenv("LIGHTRAG_WORKING_DIR", "/app/rag_storage")
+            ),
+            OLLAMA_HOST=os.getenv("OLLAMA_HOST", "http://ollama:11434"),
+            LLM_MODEL=os.getenv("LLM_MODEL", "llama3.2"),
+            EMBEDDING_MODEL=os.getenv("EMBEDDING_MODEL", "nomic-embed-text"),
+            EMBEDDING_DIM=int(os.getenv("EMBEDDING_DIM", "768")),
+            LLM_CONTEXT_SIZE=int(os.getenv("LLM_CONTEXT_SIZE", "32768")),
+            INDEX_CONCURRENCY=int(os.getenv("INDEX_CONCURRENCY", "2")),
+            LLM_TIMEOUT=int(os.getenv("LLM_TIMEOUT", "600")),
+            EMBED_TIMEOUT=int(os.getenv("EMBED_TIMEOUT", "120")),
+            QUERY_TIMEOUT=int(os.getenv("QUERY_TIMEOUT", "300")),
+            LOG_LEVEL=os.getenv("LOG_LEVEL", "INFO"),
+            LOG_DIR=Path(os.getenv("LOG_DIR", "/app/logs")),
+            RATE_LIMIT_ENABLED=os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true",
+            RATE_LIMIT_REQUESTS=int(os.getenv("RATE_LIMIT_REQUESTS", "100")),
+            RATE_LIMIT_WINDOW=int(os.getenv("RATE_LIMIT_WINDOW", "60")),
+        )
+
+    def __post_init__(self):
         """Validación en startup"""
         self._validate_paths()
         self._validate_configuration()
@@ -95,6 +130,9 @@ class Settings:
         if self.QUERY_TIMEOUT <= 0:
             raise ValueError("QUERY_TIMEOUT must be greater than 0")
 
+        if self.INDEX_CONCURRENCY <= 0:
+            raise ValueError("INDEX_CONCURRENCY must be greater than 0")
+
         if self.MAX_STREAM_CHUNKS <= 0:
             raise ValueError("MAX_STREAM_CHUNKS must be greater than 0")
 
@@ -104,4 +142,4 @@ class Settings:
 
 
 # Instancia global singleton
-settings = Settings()
+settings = Settings.from_env()
@@ -1,23 +1,27 @@
-from fastapi import FastAPI, Response
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
 from routes.notes import router as notes_router, markdown_service
 from routes.chat import router as chat_router
+from services.lightrag_service import lightrag_service, get_lightrag_service
 import asyncio
 from pathlib import Path
 
 from config.settings import settings
-from config.logging import setup_logging
+from config.logging import setup_logging, stop_logging
 from config.cache import CacheControlMiddleware
+from config.cors import FastPathCORSMiddleware
 
 # Setup logging
 logger = setup_logging(log_level=settings.LOG_LEVEL, log_dir=settings.LOG_DIR)
 
 # Vault sync scheduler
-async def vault_sync_scheduler():
-    """Background task to periodically sync the vault repository"""
+async def vault_sync_scheduler(sync_event: asyncio.Event):
+    """
+    Background task to periodically sync the vault repository.
+    Setting ``sync_event`` wakes it up early (see POST /api/admin/sync).
+    """
     
     sync_interval = settings.VAULT_SYNC_INTERVAL
     repo_url = settings.REPO_URL
@@ -33,12 +37,17 @@ async def vault_sync_scheduler():
     logger.info(f"Vault sync scheduler started - syncing every {sync_interval} seconds")
     
     while True:
-        await asyncio.sleep(sync_interval)
         try:
-            logger.info(f"Running scheduled vault sync...")
+            await asyncio.wait_for(sync_event.wait(), timeout=sync_interval)
+        except asyncio.TimeoutError:
+            pass
+        # Clear before syncing so a trigger during the sync schedules another run
+        sync_event.clear()
+        try:
+            logger.info("Running scheduled vault sync...")
             success = markdown_service.sync_repository()
             if success:
-                markdown_service._cache.clear()  # Limpiar caché después de sync exitoso
+                # sync_repository ya invalidó el caché de notas
                 logger.info("Scheduled vault sync completed successfully")
             else:
                 logger.warning("Scheduled vault sync failed")
@@ -50,7 +59,15 @@ async def lifespan(app: FastAPI):
     """Manage application lifespan events"""
     # Startup: create background sync task
     logger.info("Starting Realm Keeper API")
-    sync_task = asyncio.create_task(vault_sync_scheduler())
+    # Bind the LightRAG singleton once instead of resolving it per request
+    try:
+        app.state.lightrag = await get_lightrag_service()
+    except Exception:
+        # Keep serving: the service initializes lazily on first query
+        logger.exception("LightRAG initialization failed at startup")
+        app.state.lightrag = lightrag_service
+    app.state.sync_event = asyncio.Event()
+    sync_task = asyncio.create_task(vault_sync_scheduler(app.state.sync_event))
     yield
     # Shutdown: cancel the sync task
     logger.info("Shutting down Realm Keeper API")
@@ -59,8 +76,17 @@ async def lifespan(app: FastAPI):
         await sync_task
     except asyncio.CancelledError:
         logger.info("Vault sync scheduler stopped")
+    # Close LightRAG storages and the pooled Ollama client
+    await app.state.lightrag.finalize()
+    # Flush queued log records before the process exits
+    stop_logging()
 
-app = FastAPI(title="Realm Keeper API", lifespan=lifespan)
+# orjson (Rust) encodes JSON responses much faster than the stdlib encoder
+app = FastAPI(
+    title="Realm Keeper API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # Configure CORS - use centralized settings
 cors_origins = settings.CORS_ALLOWED_ORIGINS
@@ -68,9 +94,9 @@ cors_origins = settings.CORS_ALLOWED_ORIGINS
 # Add Cache Control middleware (debe ir antes de CORS)
 app.add_middleware(CacheControlMiddleware)
 
-# Add CORS middleware with correct configuration
+# Add CORS middleware with correct configuration (skipped for requests without Origin)
 app.add_middleware(
-    CORSMiddleware,
+    FastPathCORSMiddleware,
     allow_origins=cors_origins,
     allow_credentials=True,
     allow_methods=["*"],  # Allow all methods including OPTIONS
@@ -79,31 +105,33 @@ app.add_middleware(
     max_age=600,  # Cache preflight responses for 10 minutes
 )
 
-# Custom endpoint for assets with CORS headers
-assets_path = settings.VAULT_PATH / '_assets'
-
-@app.get("/assets/{filename:path}")
-async def get_asset(filename: str):
-    """Serve static assets with proper CORS headers"""
-    file_path = assets_path / filename
-    if not file_path.exists() or not file_path.is_file():
-        return Response(status_code=404, content="File not found")
+class VaultAssets(StaticFiles):
+    """StaticFiles that answers 404 while the vault has no _assets directory"""
     
-    # Use the first configured origin for assets (primary frontend)
-    primary_origin = cors_origins[0] if cors_origins else "*"
-    return FileResponse(
-        file_path,
-        headers={
-            "Access-Control-Allow-Origin": primary_origin,
-            "Access-Control-Allow-Methods": "GET, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization",
-        }
-    )
+    async def check_config(self) -> None:
+        # _assets may be missing, or removed by the clone in sync_repository
+        if self.directory is not None and not Path(self.directory).is_dir():
+            return
+        await super().check_config()
+
+# Serve vault assets directly via StaticFiles. CORS headers come from
+# CORSMiddleware and the year-long immutable Cache-Control from CacheControlMiddleware
+assets_path = settings.VAULT_PATH / '_assets'
+app.mount("/assets", VaultAssets(directory=assets_path, check_dir=False), name="assets")
 
 # Include routers
 app.include_router(notes_router)
 app.include_router(chat_router)
 
+@app.post("/api/admin/sync", status_code=202)
+async def trigger_vault_sync(request: Request):
+    """Wake the vault sync scheduler to run a sync now instead of waiting for the interval"""
+    if settings.VAULT_SYNC_INTERVAL <= 0 or not settings.REPO_URL:
+        raise HTTPException(status_code=400, detail="Vault sync scheduler is disabled")
+    
+    request.app.state.sync_event.set()
+    return {"message": "Vault sync scheduled"}
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Realm Keeper API"}
@@ -1,9 +1,11 @@
-from pydantic import BaseModel
-from typing import Optional, List, Dict
+from pydantic import BaseModel, ConfigDict, PrivateAttr
+from typing import Any, FrozenSet, Optional, List, Dict
 
 
 class Note(BaseModel):
     """Modelo para una nota de Markdown"""
+    model_config = ConfigDict(frozen=True)
+
     id: str  # Path relativo desde el root del vault
     title: str
     path: str  # Path completo incluyendo directorios
@@ -15,8 +17,21 @@ class Note(BaseModel):
 
 class NoteMetadata(BaseModel):
     """Metadata ligera para listar notas"""
+    model_config = ConfigDict(frozen=True)
+
     id: str
     title: str
     path: str
     tags: List[str] = []
     type: Optional[str] = None
+    
+    # Tags en minúsculas precalculados para filtrar con intersección de sets
+    _tag_set: FrozenSet[str] = PrivateAttr(default=frozenset())
+    
+    def model_post_init(self, __context: Any) -> None:
+        self._tag_set = frozenset(t.lower() for t in self.tags)
+    
+    @property
+    def tag_set(self) -> FrozenSet[str]:
+        """Tags de la nota en minúsculas (no se serializa)"""
+        return self._tag_set
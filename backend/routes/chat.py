@@ -2,29 +2,54 @@
 Chat routes for Realm Keeper
 Provides endpoints for RAG-based chat functionality
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, field_validator
 from typing import Optional, List
 import asyncio
-import inspect
+import time
 
-from services.lightrag_service import LightRAGService, get_lightrag_service
+from services.lightrag_service import LightRAGService
 from config.logging import get_logger
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
+# SSE batching: flush when the buffer reaches this size or after this many seconds
+_SSE_FLUSH_BYTES = 4096
+_SSE_FLUSH_INTERVAL = 0.05
+# Hard cap on streamed bytes, alongside the chunk cap (~10MB)
+_MAX_STREAM_BYTES = 10 * 1024 * 1024
+
+# Only the most recent messages of the conversation are kept for context
+_MAX_HISTORY_MESSAGES = 20
+
+# Pre-encoded SSE sentinels
+_SSE_DONE = b"data: [DONE]\n\n"
+_SSE_MAX_EXCEEDED = b"data: [MAX_LENGTH_EXCEEDED]\n\n"
+_SSE_TIMEOUT = b"data: [TIMEOUT: Query took more than 5 minutes]\n\n"
+
+
+def _sse_event(text: str) -> bytes:
+    """Frame text as one SSE event, with a data: line per line of text"""
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return b"data: " + text.encode().replace(b"\n", b"\ndata: ") + b"\n\n"
+
 
 class ChatMessage(BaseModel):
     """A single chat message"""
+    model_config = ConfigDict(frozen=True)
+
     role: str = Field(..., description="Role of the message sender (user/assistant)")
     content: str = Field(..., description="Content of the message")
 
 
 class ChatRequest(BaseModel):
     """Request model for chat endpoint"""
+    model_config = ConfigDict(frozen=True)
+
     message: str = Field(..., description="The user's message/question")
     mode: str = Field(
         default="hybrid",
@@ -33,18 +58,41 @@ class ChatRequest(BaseModel):
     stream: bool = Field(default=False, description="Whether to stream the response")
     conversation_history: Optional[List[ChatMessage]] = Field(
         default=None,
-        description="Previous conversation messages for context"
+        description=f"Previous conversation messages for context (last {_MAX_HISTORY_MESSAGES} kept)"
     )
+    
+    @field_validator("conversation_history", mode="before")
+    @classmethod
+    def cap_history(cls, v):
+        """Trim the history before validation so its cost stays bounded"""
+        if isinstance(v, list) and len(v) > _MAX_HISTORY_MESSAGES:
+            return v[-_MAX_HISTORY_MESSAGES:]
+        return v
+
+
+# Serializes the whole history in one pydantic-core call instead of a per-message dict literal
+_history_adapter = TypeAdapter(List[ChatMessage])
+
+
+def _dump_history(messages: Optional[List[ChatMessage]]) -> Optional[List[dict]]:
+    """Convert conversation history to the list of role/content dicts LightRAG expects"""
+    if not messages:
+        return None
+    return _history_adapter.dump_python(messages)
 
 
 class ChatResponse(BaseModel):
     """Response model for chat endpoint"""
+    model_config = ConfigDict(frozen=True)
+
     response: str = Field(..., description="The assistant's response")
     mode: str = Field(..., description="The query mode used")
 
 
 class IndexRequest(BaseModel):
     """Request model for indexing endpoint"""
+    model_config = ConfigDict(frozen=True)
+
     force_reindex: bool = Field(
         default=False,
         description="Whether to force reindexing of all documents"
@@ -53,6 +101,8 @@ class IndexRequest(BaseModel):
 
 class IndexResponse(BaseModel):
     """Response model for indexing endpoint"""
+    model_config = ConfigDict(frozen=True)
+
     status: str
     indexed_files: Optional[int] = None
     total_files: Optional[int] = None
@@ -62,6 +112,8 @@ class IndexResponse(BaseModel):
 
 class DeleteIndexResponse(BaseModel):
     """Response model for delete index endpoint"""
+    model_config = ConfigDict(frozen=True)
+
     status: str
     message: str
     deleted_files: Optional[List[str]] = None
@@ -69,6 +121,8 @@ class DeleteIndexResponse(BaseModel):
 
 class StatusResponse(BaseModel):
     """Response model for status endpoint"""
+    model_config = ConfigDict(frozen=True)
+
     initialized: bool
     indexing: bool
     working_dir: str
@@ -84,17 +138,18 @@ class StatusResponse(BaseModel):
 
 @router.get("/status", response_model=StatusResponse)
 async def get_status(
-    service: LightRAGService = Depends(get_lightrag_service)
+    req: Request,
 ) -> StatusResponse:
     """Get the current status of the LightRAG service"""
+    service: LightRAGService = req.app.state.lightrag
     status = await service.get_status()
     return StatusResponse(**status)
 
 
 @router.post("/index", response_model=IndexResponse)
 async def index_vault(
+    req: Request,
     request: IndexRequest = IndexRequest(),
-    service: LightRAGService = Depends(get_lightrag_service)
 ) -> IndexResponse:
     """
     Index all markdown files from the vault into LightRAG.
@@ -102,6 +157,7 @@ async def index_vault(
     Returns immediately and runs indexing in the background.
     Poll /chat/status to check progress.
     """
+    service: LightRAGService = req.app.state.lightrag
     # Check if already indexing
     if service.is_indexing():
         return IndexResponse(status="in_progress", message="Indexing already in progress")
@@ -114,13 +170,14 @@ async def index_vault(
 
 @router.delete("/index", response_model=DeleteIndexResponse)
 async def delete_index(
-    service: LightRAGService = Depends(get_lightrag_service)
+    req: Request,
 ) -> DeleteIndexResponse:
     """
     Delete all indexed data from LightRAG.
     This removes the knowledge graph and all embeddings.
     Use this to start fresh or free up storage.
     """
+    service: LightRAGService = req.app.state.lightrag
     result = await service.delete_index()
     return DeleteIndexResponse(**result)
 
@@ -128,7 +185,7 @@ async def delete_index(
 @router.post("/query", response_model=ChatResponse)
 async def chat_query(
     request: ChatRequest,
-    service: LightRAGService = Depends(get_lightrag_service)
+    req: Request,
 ) -> ChatResponse:
     """
     Query the LightRAG knowledge base with a question.
@@ -140,13 +197,9 @@ async def chat_query(
     - **hybrid**: Combines local and global retrieval methods
     - **mix**: Integrates knowledge graph and vector retrieval
     """
+    service: LightRAGService = req.app.state.lightrag
     # Convert conversation history to the expected format
-    history = None
-    if request.conversation_history:
-        history = [
-            {"role": msg.role, "content": msg.content}
-            for msg in request.conversation_history
-        ]
+    history = _dump_history(request.conversation_history)
     
     try:
         response = await service.query(
@@ -165,7 +218,7 @@ async def chat_query(
 @router.post("/query/stream")
 async def chat_query_stream(
     request: ChatRequest,
-    service: LightRAGService = Depends(get_lightrag_service)
+    req: Request,
 ):
     """
     Query the LightRAG knowledge base with streaming response.
@@ -174,15 +227,13 @@ async def chat_query_stream(
     - Maximum 10000 chunks (~10MB of text)
     - Comprehensive error handling
     """
+    service: LightRAGService = req.app.state.lightrag
     # Convert conversation history to the expected format
-    history = None
-    if request.conversation_history:
-        history = [
-            {"role": msg.role, "content": msg.content}
-            for msg in request.conversation_history
-        ]
+    history = _dump_history(request.conversation_history)
     
     async def generate():
+        # Coalesce tokens into ~4KB SSE batches to avoid one ASGI send per token
+        buf = bytearray()
         try:
             # Timeout de 5 minutos para la respuesta completa
             async with asyncio.timeout(300):
@@ -194,33 +245,66 @@ async def chat_query_stream(
                 )
                 
                 chunk_count = 0
+                byte_count = 0
                 max_chunks = 10000  # ~10MB de tokens
+                last_flush = time.monotonic()
                 
-                # Check if response is an async generator
-                if inspect.isasyncgen(response):
-                    async for chunk in response:
-                        if chunk_count >= max_chunks:
-                            logger.warning(f"Query stream exceeded max chunks ({max_chunks})")
-                            yield "data: [MAX_LENGTH_EXCEEDED]\n\n"
+                # The next chunk is awaited as a task so a pause in the model can
+                # time out and flush the buffer without cancelling the stream
+                chunks = aiter(response)
+                next_chunk = asyncio.ensure_future(anext(chunks))
+                try:
+                    while True:
+                        if buf:
+                            remaining = last_flush + _SSE_FLUSH_INTERVAL - time.monotonic()
+                            done, _ = await asyncio.wait({next_chunk}, timeout=max(remaining, 0))
+                            if not done:
+                                yield bytes(buf)
+                                buf.clear()
+                                last_flush = time.monotonic()
+                                continue
+                        
+                        try:
+                            chunk = await next_chunk
+                        except StopAsyncIteration:
                             break
                         
-                        yield f"data: {chunk}\n\n"
+                        if chunk_count >= max_chunks or byte_count >= _MAX_STREAM_BYTES:
+                            logger.warning(
+                                f"Query stream exceeded max length "
+                                f"({chunk_count} chunks, {byte_count} bytes)"
+                            )
+                            buf.extend(_SSE_MAX_EXCEEDED)
+                            break
+                        
+                        next_chunk = asyncio.ensure_future(anext(chunks))
+                        event = _sse_event(chunk)
+                        buf.extend(event)
                         chunk_count += 1
-                else:
-                    # If not streaming, yield the whole response
-                    yield f"data: {response}\n\n"
+                        byte_count += len(event)
+                        
+                        if len(buf) >= _SSE_FLUSH_BYTES:
+                            yield bytes(buf)
+                            buf.clear()
+                            last_flush = time.monotonic()
+                finally:
+                    next_chunk.cancel()
                 
                 logger.info(f"Query stream completed: {chunk_count} chunks, mode={request.mode}")
-                yield "data: [DONE]\n\n"
+                buf.extend(_SSE_DONE)
+                yield bytes(buf)
+                buf.clear()
         
         except asyncio.TimeoutError:
             logger.error("Query stream timeout: exceeded 5 minute limit")
-            yield "data: [TIMEOUT: Query took more than 5 minutes]\n\n"
+            buf.extend(_SSE_TIMEOUT)
+            yield bytes(buf)
         except Exception as e:
             logger.error(f"Stream error: {str(e)}", exc_info=True)
             # Send truncated error message (first 200 chars)
             error_msg = str(e)[:200]
-            yield f"data: [ERROR: {error_msg}]\n\n"
+            buf.extend(_sse_event(f"[ERROR: {error_msg}]"))
+            yield bytes(buf)
     
     return StreamingResponse(
         generate(),
@@ -235,12 +319,13 @@ async def chat_query_stream(
 
 @router.post("/initialize")
 async def initialize_service(
-    service: LightRAGService = Depends(get_lightrag_service)
+    req: Request,
 ) -> dict:
     """
     Explicitly initialize the LightRAG service.
     Usually called automatically on first use.
     """
+    service: LightRAGService = req.app.state.lightrag
     if service.is_initialized():
         return {"status": "already_initialized"}
     
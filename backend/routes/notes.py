@@ -1,5 +1,8 @@
-from fastapi import APIRouter, HTTPException, Query
-from pathlib import Path
+import heapq
+import os
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
+from rapidfuzz import fuzz, process, utils
 from typing import List, Optional
 from models.note import Note, NoteMetadata
 from services.markdown_service import MarkdownService
@@ -17,9 +20,24 @@ markdown_service = MarkdownService(
     ignore_tag=settings.NOTE_TAG_IGNORE
 )
 
+# Raíz del vault resuelta una sola vez, con separador final para comparar prefijos
+VAULT_ROOT = os.path.join(str(markdown_service.vault_path.resolve()), "")
 
-@router.get("/notes", response_model=List[NoteMetadata])
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Devuelve un 304 vacío si el cliente ya tiene la versión actual del vault"""
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+@router.get(
+    "/notes",
+    response_class=ORJSONResponse,
+    responses={200: {"model": List[NoteMetadata]}},
+)
 async def get_all_notes(
+    request: Request,
     search: Optional[str] = Query(None, description="Buscar por título (fuzzy matching)"),
     tags: Optional[str] = Query(None, description="Filtrar por tags (separados por coma)"),
     limit: int = Query(50, ge=1, le=500, description="Máximo 500 notas por página"),
@@ -35,35 +53,59 @@ async def get_all_notes(
     - **offset**: Offset para paginación (default 0)
     
     Ejemplo: GET /api/notes?search=Wei&tags=campaign&limit=25&offset=0
+    
+    Responde 304 si If-None-Match coincide con el ETag de la versión del vault.
     """
     try:
-        all_notes = markdown_service.get_all_notes()
+        # Columnas paralelas: se filtra por índice y solo se materializa la página.
+        # El ETag sale del mismo scan del vault que las columnas
+        etag, notes, titles, tag_index = markdown_service.get_note_columns()
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
         
-        # Filtrar por búsqueda (fuzzy matching)
-        if search:
-            from fuzzywuzzy import fuzz
-            all_notes = [
-                n for n in all_notes
-                if fuzz.token_set_ratio(search.lower(), n.title.lower()) > 60
-            ]
-            logger.debug(f"Fuzzy search for '{search}' returned {len(all_notes)} notes")
+        candidates = range(len(notes))
         
-        # Filtrar por tags
+        # Filtrar por tags (antes de la búsqueda: es barato y reduce candidatos).
+        # Unión de las posiciones del índice invertido, en el orden original
         if tags:
             tag_list = [t.strip().lower() for t in tags.split(',') if t.strip()]
-            all_notes = [
-                n for n in all_notes
-                if any(t.lower() in [nt.lower() for nt in n.tags] for t in tag_list)
-            ]
-            logger.debug(f"Tag filter for {tag_list} returned {len(all_notes)} notes")
+            candidates = sorted(set().union(*(tag_index.get(t, ()) for t in tag_list)))
+            titles = [titles[i] for i in candidates]
+            logger.debug(f"Tag filter for {tag_list} returned {len(candidates)} notes")
+        
+        # Filtrar por búsqueda (fuzzy matching)
+        if search:
+            # extract_iter evalúa el scorer en C y poda candidatos con score_cutoff,
+            # devolviendo (título, score, índice). Los títulos vienen ya normalizados
+            # (default_process, como el full_process de fuzzywuzzy) desde el
+            # servicio: solo se procesa la query
+            matches = list(process.extract_iter(
+                utils.default_process(search),
+                titles,
+                scorer=fuzz.token_set_ratio,
+                processor=None,
+                score_cutoff=60,
+            ))
+            logger.debug(f"Fuzzy search for '{search}' returned {len(matches)} notes")
+            
+            # Paginación: solo el top offset+limit por score (O(N log K)), estable en empates
+            total = len(matches)
+            top = heapq.nlargest(offset + limit, matches, key=lambda m: m[1])
+            page = [candidates[idx] for _, _, idx in top[offset:]]
+        else:
+            # Paginación
+            total = len(candidates)
+            page = candidates[offset:offset + limit]
         
-        # Paginación
-        total = len(all_notes)
-        paginated = all_notes[offset:offset + limit]
+        # Dicts planos devueltos directamente como ORJSONResponse: sin
+        # response_model ni jsonable_encoder, FastAPI no revalida cada nota
+        # (las NoteMetadata ya se construyeron validadas desde el vault)
+        paginated = [notes[i].model_dump() for i in page]
         
         logger.info(f"get_all_notes: returned {len(paginated)} of {total} notes (offset={offset}, limit={limit})")
         
-        return paginated
+        return ORJSONResponse(content=paginated, headers={"ETag": etag})
     except Exception as e:
         logger.error(f"Error getting notes: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error getting notes: {str(e)}")
@@ -80,14 +122,13 @@ async def get_note(note_path: str):
     # Normalizar path
     normalized_path = note_path.strip('/')
     
-    # Validar que no intente path traversal
-    try:
-        full_path = (Path(markdown_service.vault_path) / f"{normalized_path}.md").resolve()
-        vault_resolved = Path(markdown_service.vault_path).resolve()
-        
-        # Verificar que el archivo esté dentro del vault
-        full_path.relative_to(vault_resolved)
-    except (ValueError, RuntimeError):
+    # Validar que no intente path traversal: normalización léxica contra la
+    # raíz del vault ya resuelta (descarte rápido, sin syscalls) y luego
+    # realpath para que un symlink del vault no apunte fuera de él
+    full_path = os.path.normpath(os.path.join(VAULT_ROOT, f"{normalized_path}.md"))
+    
+    # Verificar que el archivo esté dentro del vault
+    if not full_path.startswith(VAULT_ROOT) or not os.path.realpath(full_path).startswith(VAULT_ROOT):
         logger.warning(f"Path traversal attempt detected: {note_path}")
         raise HTTPException(
             status_code=403,
@@ -143,26 +184,27 @@ async def get_container_folders():
     """
     try:
         all_notes = markdown_service.get_all_notes()
-        all_note_ids = set(n.id for n in all_notes)
+        all_note_ids = {n.id for n in all_notes}
         
-        # Encontrar todas las carpetas que aparecen en los paths
+        # Encontrar todas las carpetas que aparecen en los paths en una sola pasada:
+        # se recortan ancestros con rpartition y se corta apenas uno ya fue visto
+        # (sus ancestros también lo fueron)
         folders_found = set()
         for note_id in all_note_ids:
-            parts = note_id.split('/')
-            # Agregar cada nivel de carpeta excepto el último (que es la nota)
-            for i in range(len(parts) - 1):
-                folder_path = '/'.join(parts[:i + 1])
-                folders_found.add(folder_path)
+            folder = note_id.rpartition('/')[0]
+            while folder and folder not in folders_found:
+                folders_found.add(folder)
+                folder = folder.rpartition('/')[0]
         
         # Encontrar carpetas contenedoras: carpetas cuyo path no tiene una nota correspondiente
         # Ej: si existe "Factions/Drunaris" como nota, entonces "Factions" es contenedora
         # pero si existe "Factions/Factions" como nota, entonces "Factions" NO es contenedora
-        container_folders = set()
-        for folder in folders_found:
-            if folder not in all_note_ids:
-                container_folders.add(folder.split('/')[-1])  # Solo el nombre de la carpeta
+        container_folders = {
+            folder.rpartition('/')[2]  # Solo el nombre de la carpeta
+            for folder in folders_found - all_note_ids
+        }
         
-        return sorted(list(container_folders))
+        return sorted(container_folders)
     except Exception as e:
         logger.error(f"Error getting container folders: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error getting container folders: {str(e)}")
@@ -181,80 +223,26 @@ async def get_vault_info():
     }
 
 
-@router.get("/graph/all")
-async def get_graph_data():
+@router.get("/graph/all", response_class=ORJSONResponse)
+async def get_graph_data(request: Request):
     """
     Obtiene datos del grafo completo de todas las notas y sus wikilinks.
-    Optimizado para alto rendimiento: extrae links sin cargar contenido completo.
+    El JSON se serializa con orjson y se memoiza en el servicio; solo se
+    regenera cuando cambia alguna nota. Responde 304 si If-None-Match
+    coincide con el ETag de la versión del vault.
     """
     try:
-        # Get metadata for all notes (single pass)
-        notes_metadata = markdown_service.get_all_notes()
-        
-        # Create nodes and build lookup maps
-        nodes = []
-        node_ids = set()  # Set de IDs (paths)
-        title_to_id = {}  # Map de título a ID para resolver wikilinks
-        
-        for note_meta in notes_metadata:
-            node_ids.add(note_meta.id)
-            # Map título a ID para resolver wikilinks por título
-            title_to_id[note_meta.title] = note_meta.id
-            
-            nodes.append({
-                "id": note_meta.id,
-                "title": note_meta.title,
-                "path": note_meta.id,
-                "tags": note_meta.tags,
-                "type": note_meta.type
-            })
-        
-        # Extract links efficiently (single pass, no full note load)
-        links = []
-        links_set = set()  # Para evitar duplicados
+        # ETag y grafo del mismo scan del vault
+        etag, payload = markdown_service.get_graph_json()
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
         
-        for note_meta in notes_metadata:
-            # Get only the links without loading full note content
-            wikilinks = markdown_service.get_note_links_only(note_meta.id)
-            
-            for link in wikilinks:
-                # Intentar resolver el link de 3 formas:
-                # 1. Directo por ID
-                # 2. Por título exacto
-                # 3. Por coincidencia parcial del título
-                target_id = None
-                
-                if link in node_ids:
-                    # Match directo con ID
-                    target_id = link
-                elif link in title_to_id:
-                    # Match con título exacto
-                    target_id = title_to_id[link]
-                else:
-                    # Buscar por coincidencia de título (case-insensitive)
-                    link_lower = link.lower()
-                    for title, note_id in title_to_id.items():
-                        if title.lower() == link_lower:
-                            target_id = note_id
-                            break
-                
-                # Create link si el target existe
-                if target_id:
-                    link_key = (note_meta.id, target_id)
-                    if link_key not in links_set:
-                        links_set.add(link_key)
-                        links.append({
-                            "source": note_meta.id,
-                            "target": target_id
-                        })
-        
-        logger.info(f"Graph data generated: {len(nodes)} nodes, {len(links)} links")
-        
-        return {
-            "nodes": nodes,
-            "links": links
-        }
+        return Response(
+            content=payload,
+            media_type="application/json",
+            headers={"ETag": etag},
+        )
     except Exception as e:
         logger.error(f"Error generating graph: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error generating graph: {str(e)}")
-
@@ -4,8 +4,12 @@ Provides RAG-based chat functionality for the vault notes
 """
 import asyncio
 import logging
-from typing import Optional, AsyncGenerator
+import os
+from pathlib import Path
+from typing import Optional, AsyncIterator
 import numpy as np
+import httpx
+import orjson
 
 from lightrag import LightRAG, QueryParam
 from lightrag.llm.ollama import ollama_model_complete, ollama_embed
@@ -24,6 +28,7 @@ class LightRAGService:
     
     _instance: Optional["LightRAGService"] = None
     _rag: Optional[LightRAG] = None
+    _http_client: Optional[httpx.AsyncClient] = None
     _initialized: bool = False
     _indexing: bool = False
     _indexing_progress: int = 0
@@ -75,11 +80,23 @@ class LightRAGService:
         
         await self._rag.initialize_storages()
         await initialize_pipeline_status()
+        
+        # Long-lived client so every chat turn reuses pooled Ollama connections
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                base_url=settings.OLLAMA_HOST,
+                timeout=300.0,
+                limits=httpx.Limits(max_keepalive_connections=10),
+            )
+        
         self._initialized = True
         logger.info("LightRAG initialized successfully")
     
     async def finalize(self) -> None:
         """Clean up LightRAG resources"""
+        if self._http_client:
+            await self._http_client.aclose()
+            self._http_client = None
         if self._rag:
             await self._rag.finalize_storages()
             self._initialized = False
@@ -115,43 +132,54 @@ class LightRAGService:
         vault_path = settings.VAULT_PATH
         
         try:
-            # Get all markdown files
-            md_files = list(vault_path.rglob("*.md"))
-            # Filter out templates early
-            md_files = [f for f in md_files if "templates" not in str(f)]
+            # Get all markdown files, pruning templates and hidden dirs (.git)
+            # during the walk instead of filtering afterwards
+            md_files = []
+            for root, dirs, files in os.walk(vault_path):
+                dirs[:] = [d for d in dirs if d != "templates" and not d.startswith(".")]
+                for name in files:
+                    if name.endswith(".md"):
+                        md_files.append(Path(root) / name)
             self._indexing_total = len(md_files)
             logger.info(f"Found {len(md_files)} markdown files to index")
             
             indexed_count = 0
             errors = []
+            # Bound concurrent inserts so Ollama is not flooded
+            semaphore = asyncio.Semaphore(settings.INDEX_CONCURRENCY)
+            
+            async def _index_one(md_file):
+                nonlocal indexed_count
+                async with semaphore:
+                    try:
+                        relative_path = md_file.relative_to(vault_path)
+                        self._indexing_current_file = str(relative_path)
+                        
+                        # Read file content off the event loop
+                        content = await asyncio.to_thread(_read_markdown, md_file)
+                        
+                        # Skip empty files
+                        if content is None or not content.strip():
+                            return
+                        
+                        # Create a document with metadata
+                        header = f"# Source: {relative_path}\n\n"
+                        
+                        # Insert into LightRAG
+                        await self._rag.ainsert(header + content)
+                        indexed_count += 1
+                        
+                        logger.debug(f"Indexed: {relative_path}")
+                        
+                    except Exception as e:
+                        error_msg = f"Error indexing {md_file}: {str(e)}"
+                        logger.error(error_msg)
+                        errors.append(error_msg)
+                    finally:
+                        # Update progress (single-threaded event loop, += is safe)
+                        self._indexing_progress += 1
             
-            for idx, md_file in enumerate(md_files):
-                try:
-                    # Update progress
-                    self._indexing_progress = idx + 1
-                    relative_path = md_file.relative_to(vault_path)
-                    self._indexing_current_file = str(relative_path)
-                    
-                    # Read file content
-                    content = md_file.read_text(encoding="utf-8")
-                    
-                    # Skip empty files
-                    if not content.strip():
-                        continue
-                    
-                    # Create a document with metadata
-                    doc_content = f"# Source: {relative_path}\n\n{content}"
-                    
-                    # Insert into LightRAG
-                    await self._rag.ainsert(doc_content)
-                    indexed_count += 1
-                    
-                    logger.debug(f"Indexed: {relative_path}")
-                    
-                except Exception as e:
-                    error_msg = f"Error indexing {md_file}: {str(e)}"
-                    logger.error(error_msg)
-                    errors.append(error_msg)
+            await asyncio.gather(*(_index_one(md_file) for md_file in md_files))
             
             return {
                 "status": "success",
@@ -176,7 +204,7 @@ class LightRAGService:
         mode: str = "hybrid",
         stream: bool = False,
         conversation_history: Optional[list] = None,
-    ) -> str | AsyncGenerator[str, None]:
+    ) -> str | AsyncIterator[str]:
         """
         Query the LightRAG knowledge base with custom prompt handling
         
@@ -187,7 +215,8 @@ class LightRAGService:
             conversation_history: Optional list of previous messages
         
         Returns:
-            The response from LightRAG (string or async generator if streaming)
+            The response from LightRAG (string, or an async iterator of chunks
+            when streaming)
         """
         if not self._initialized:
             await self.initialize()
@@ -221,22 +250,40 @@ QUESTION: {question}
 
 ANSWER (based only on the context above):"""
         
-        # Call Ollama directly with httpx
-        import httpx
+        payload = {
+            "model": settings.LLM_MODEL,
+            "prompt": simple_prompt,
+            "system": "You are a helpful assistant that answers questions ONLY based on the provided context. Never make up information.",
+            "stream": stream,
+            "options": {"num_ctx": settings.LLM_CONTEXT_SIZE}
+        }
         
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            response = await client.post(
-                f"{settings.OLLAMA_HOST}/api/generate",
-                json={
-                    "model": settings.LLM_MODEL,
-                    "prompt": simple_prompt,
-                    "system": "You are a helpful assistant that answers questions ONLY based on the provided context. Never make up information.",
-                    "stream": False,
-                    "options": {"num_ctx": settings.LLM_CONTEXT_SIZE}
-                }
-            )
-            result = response.json()
-            return result.get("response", "Error generating response")
+        # Streaming callers get Ollama's deltas as they are generated
+        if stream:
+            return self._stream_generate(payload)
+        
+        # Call Ollama directly with the shared httpx client
+        response = await self._http_client.post("/api/generate", json=payload)
+        result = response.json()
+        return result.get("response", "Error generating response")
+    
+    async def _stream_generate(self, payload: dict) -> AsyncIterator[str]:
+        """
+        Yield response deltas from Ollama's newline-delimited JSON stream.
+        An {"error": ...} line mid-stream raises so the route sends its error frame.
+        """
+        async with self._http_client.stream("POST", "/api/generate", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = orjson.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(f"Ollama error: {data['error']}")
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    break
     
     async def get_status(self) -> dict:
         """Get the current status of LightRAG service"""
@@ -297,15 +344,12 @@ ANSWER (based only on the context above):"""
                 "vdb_relationships.json",
             ]
             
-            deleted_files = []
             working_path = settings.LIGHTRAG_WORKING_DIR
             
-            for filename in files_to_delete:
-                file_path = working_path / filename
-                if file_path.exists():
-                    file_path.unlink()
-                    deleted_files.append(filename)
-                    logger.info(f"Deleted: {filename}")
+            # Unlink off the event loop so other requests are not stalled
+            deleted_files = await asyncio.to_thread(
+                _delete_files_sync, working_path, files_to_delete
+            )
             
             # Reinitialize LightRAG with fresh storage
             await self.initialize()
@@ -321,12 +365,33 @@ ANSWER (based only on the context above):"""
             return {"status": "error", "message": str(e)}
 
 
+def _read_markdown(md_file: Path) -> Optional[str]:
+    """Read a markdown file, returning None for zero-byte files without reading them"""
+    if md_file.stat().st_size == 0:
+        return None
+    return md_file.read_text(encoding="utf-8")
+
+
+def _delete_files_sync(directory: Path, filenames: list[str]) -> list[str]:
+    """Delete the given files from directory, returning the ones that existed"""
+    deleted = []
+    for filename in filenames:
+        try:
+            # One unlink instead of exists() + unlink()
+            os.unlink(os.path.join(directory, filename))
+        except FileNotFoundError:
+            continue
+        deleted.append(filename)
+        logger.info(f"Deleted: {filename}")
+    return deleted
+
+
 # Global service instance
 lightrag_service = LightRAGService()
 
 
 async def get_lightrag_service() -> LightRAGService:
-    """Dependency injection for FastAPI"""
+    """Return the initialized global service (bound to app.state at startup)"""
     if not lightrag_service.is_initialized():
         await lightrag_service.initialize()
     return lightrag_service
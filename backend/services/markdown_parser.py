@@ -1,54 +1,85 @@
 import re
+from functools import lru_cache
 import markdown
 import frontmatter
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
+from urllib.parse import quote
+
+# Bloque de frontmatter YAML al inicio del archivo (sobre bytes, sin decodificar).
+# Mismo cierre que python-frontmatter (primera línea de 3 o más guiones); el
+# bloque puede estar vacío, en cuyo caso group(1) es None
+_FM_RE = re.compile(rb'\A---[ \t]*\r?\n(?:(.*?)\r?\n)??-{3,}[ \t]*(?:\r?\n|\Z)', re.DOTALL)
+# Claves del frontmatter que usan los listados; sin ellas se omite el YAML
+_FM_KEYS = (b'title', b'type', b'tags')
+
+
+@lru_cache(maxsize=8)
+def _tag_regex(tag: str) -> re.Pattern:
+    """Regex de un tag inline concreto, con los mismos bordes que tag_pattern"""
+    return re.compile('#' + re.escape(tag) + r'(?![\w\-\/])')
 
 
 class MarkdownParser:
     """Parser para convertir Markdown a HTML"""
     
     def __init__(self, vault_path: Path = None):
-        self.md = markdown.Markdown(extensions=['extra', 'codehilite', 'tables'])
-        self.wikilink_pattern = re.compile(r'\[\[([^\]|]+)(\|([^\]]+))?\]\]')
-        self.image_wikilink_pattern = re.compile(r'!\[\[([^\]]+)\]\]')
+        # Conversor HTML de python-markdown, creado en el primer to_html (cargar
+        # codehilite importa pygments y el parse de notas no lo necesita)
+        self._md: Optional[markdown.Markdown] = None
         self.tag_pattern = re.compile(r'#([\w\-\/]+)')
+        # Image wikilinks, wikilinks y tags en un solo regex: una pasada por nota.
+        # Un wikilink no puede contener un ![[...]] completo: antes se convertían
+        # primero las imágenes, así que un '[[' suelto no debe tragarse la siguiente
+        self.content_pattern = re.compile(
+            r'!\[\[(?P<img>[^\]]+)\]\]'
+            r'|\[\[(?P<wl>(?:(?!!\[\[[^\]]+\]\])[^\]|])+)(?:\|(?P<wltxt>(?:(?!!\[\[[^\]]+\]\])[^\]])+))?\]\]'
+            r'|#(?P<tag>[\w\-\/]+)'
+        )
         self.vault_path = vault_path
-        self._note_index = None
+        # Índices de wikilinks {nombre o path: path}, provistos por MarkdownService
+        # con set_note_index tras recorrer el vault
+        self._note_index: Dict[str, str] = {}
+        self._note_index_lower: Dict[str, str] = {}  # Para búsqueda case-insensitive
+        self._note_encoded: Dict[str, str] = {}  # {path: path URL-encoded por segmento}
+        # Resolución de wikilinks memoizada; se recrea con cada índice nuevo
+        self._resolve_wikilink = lru_cache(maxsize=4096)(self._resolve_wikilink_uncached)
     
-    def _build_note_index(self):
-        """Construye un índice de nombre de archivo -> path completo"""
-        if self._note_index is not None or not self.vault_path:
-            return
-        
-        self._note_index = {}
-        self._note_index_lower = {}  # Índice en minúsculas para búsqueda case-insensitive
+    def set_note_index(self, note_index: Dict[str, str], note_index_lower: Dict[str, str]) -> None:
+        """
+        Reemplaza el índice nombre de archivo -> path completo usado para
+        resolver wikilinks. Se publica de una vez: los threads que parsean en
+        paralelo nunca ven un índice a medio construir.
         
-        for md_file in self.vault_path.rglob('*.md'):
-            if any(part.startswith('.') for part in md_file.parts):
-                continue
-            
-            # Nombre del archivo sin extensión
-            filename = md_file.stem
-            # Path relativo sin extensión
-            relative_path = md_file.relative_to(self.vault_path).with_suffix('')
-            resolved_path = str(relative_path).replace('\\', '/')
-            
-            # Guardar tanto el nombre simple como el path completo (case-sensitive)
-            self._note_index[filename] = resolved_path
-            self._note_index[resolved_path] = resolved_path
-            
-            # También en minúsculas para búsqueda case-insensitive
-            self._note_index_lower[filename.lower()] = resolved_path
-            self._note_index_lower[resolved_path.lower()] = resolved_path
+        También precalcula el URL-encoding de cada path resoluble, para que
+        convertir un wikilink sea un lookup en vez de un quote() por segmento.
+        """
+        self._note_encoded = {
+            resolved_path: self._encode_path(resolved_path)
+            for resolved_path in set(note_index.values())
+        }
+        self._note_index_lower = note_index_lower
+        self._note_index = note_index
+        # LRU nuevo: las resoluciones del índice anterior se descartan con él
+        self._resolve_wikilink = lru_cache(maxsize=4096)(self._resolve_wikilink_uncached)
+    
+    @staticmethod
+    def _encode_path(path: str) -> str:
+        """URL-encode cada segmento del path (preservando slashes)"""
+        return '/'.join(quote(segment, safe='') for segment in path.split('/'))
     
-    def _resolve_wikilink(self, link: str) -> str:
-        """Resuelve un wikilink a su path completo (case-insensitive)"""
+    def resolve_wikilink(self, link: str) -> str:
+        """Resuelve un wikilink a su path completo (case-insensitive, memoizado)"""
+        return self._resolve_wikilink(link)
+    
+    def _resolve_wikilink_uncached(self, link: str) -> str:
+        """
+        Resuelve un wikilink a su path completo (case-insensitive).
+        Se usa a través de self._resolve_wikilink, memoizado con lru_cache.
+        """
         if not self.vault_path:
             return link
         
-        self._build_note_index()
-        
         # Primero intentar búsqueda exacta (case-sensitive)
         if link in self._note_index:
             return self._note_index[link]
@@ -61,9 +92,43 @@ class MarkdownParser:
         # Si no se encuentra, devolver el link original
         return link
     
+    def parse_file_meta_only(
+        self, file_path: Path, ignore_tag: Optional[str] = None
+    ) -> Optional[Tuple[Dict, List[str], List[str]]]:
+        """
+        Parse liviano para listados: no convierte el contenido y solo pasa el
+        frontmatter por YAML si puede aportar title, type o tags. Sin caché
+        propio: MarkdownService cachea (y persiste) la metadata resultante.
+        
+        Si la nota tiene ignore_tag (en el frontmatter o inline) devuelve None
+        sin recorrer el contenido para extraer tags y wikilinks.
+        Returns: (frontmatter, tags, wikilinks) o None
+        """
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        
+        match = _FM_RE.match(data)
+        if match is None and data.lstrip()[:3] not in (b'---', b'+++', b'{'):
+            # Sin frontmatter
+            fm, content = {}, data.decode('utf-8').strip()
+        elif match is not None and not any(key in (match.group(1) or b'') for key in _FM_KEYS):
+            # Frontmatter sin title/type/tags: no hace falta el parser YAML
+            fm, content = {}, data[match.end():].decode('utf-8').strip()
+        else:
+            # Caso general (o formato que el regex no cubre): python-frontmatter
+            post = frontmatter.loads(data.decode('utf-8'))
+            fm, content = dict(post.metadata), post.content
+        
+        if ignore_tag and self._has_tag(fm, content, ignore_tag):
+            return None
+        
+        inline_tags, wikilinks, _ = self._scan_content(content, rewrite=False)
+        return fm, self._merge_tags(fm, inline_tags), wikilinks
+    
     def parse_file(self, file_path: Path) -> Tuple[Dict, str, List[str], List[str]]:
         """
-        Parse un archivo markdown
+        Parse un archivo markdown. Sin caché propio: MarkdownService cachea la
+        Note resultante mientras no cambien el mtime y el tamaño del archivo.
         Returns: (frontmatter, content, tags, wikilinks)
         """
         with open(file_path, 'r', encoding='utf-8') as f:
@@ -72,26 +137,33 @@ class MarkdownParser:
         # Extraer frontmatter
         fm = dict(post.metadata) if post.metadata else {}
         
-        # Contenido
-        content = post.content
-        
-        # Extraer tags
-        tags = self._extract_tags(content, fm)
-        
-        # Extraer wikilinks
-        wikilinks = self._extract_wikilinks(content)
-        
-        # Convertir image wikilinks a markdown images
-        content = self._convert_image_wikilinks(content)
-        
-        # Convertir wikilinks a links normales
-        content = self._convert_wikilinks(content)
+        # Extraer tags y wikilinks y convertir (image) wikilinks en una sola pasada
+        inline_tags, wikilinks, content = self._scan_content(post.content, rewrite=True)
+        tags = self._merge_tags(fm, inline_tags)
         
         return fm, content, tags, wikilinks
     
-    def _extract_tags(self, content: str, frontmatter: Dict) -> List[str]:
-        """Extrae tags del contenido y frontmatter"""
-        tags = set()
+    @staticmethod
+    def _has_tag(frontmatter: Dict, content: str, tag: str) -> bool:
+        """
+        Indica si la nota tiene el tag, con el mismo criterio que _merge_tags
+        y tag_pattern pero sin extraer todos los tags: primero un `in` (en C)
+        y solo si aparece, el regex del tag completo (#tag no seguido de más
+        caracteres de tag).
+        """
+        fm_tags = frontmatter.get('tags')
+        if isinstance(fm_tags, list):
+            if tag in fm_tags:
+                return True
+        elif fm_tags == tag:
+            return True
+        
+        marker = f'#{tag}'
+        return marker in content and _tag_regex(tag).search(content) is not None
+    
+    def _merge_tags(self, frontmatter: Dict, inline_tags: List[str]) -> List[str]:
+        """Combina los tags del frontmatter con los tags inline"""
+        tags = set(inline_tags)
         
         # Tags del frontmatter
         if 'tags' in frontmatter:
@@ -101,55 +173,83 @@ class MarkdownParser:
             elif isinstance(fm_tags, str):
                 tags.add(fm_tags)
         
-        # Tags inline (#tag)
-        inline_tags = self.tag_pattern.findall(content)
-        tags.update(inline_tags)
-        
-        return sorted(list(tags))
-    
-    def _extract_wikilinks(self, content: str) -> List[str]:
-        """Extrae todos los wikilinks del contenido y los resuelve a paths"""
-        matches = self.wikilink_pattern.findall(content)
-        # matches son tuplas: (link, '|text' o '', text o '')
-        # Resolver cada wikilink a su path completo
-        resolved_links = []
-        for match in matches:
-            link_text = match[0]
-            resolved_path = self._resolve_wikilink(link_text)
-            resolved_links.append(resolved_path)
-        return resolved_links
+        return sorted(tags)
     
-    def _convert_wikilinks(self, content: str) -> str:
-        """Convierte [[wikilink]] a formato de link para el frontend"""
-        from urllib.parse import quote
-        
-        def replace_wikilink(match):
-            link = match.group(1)
-            display_text = match.group(3) if match.group(3) else link
+    def _scan_content(self, content: str, rewrite: bool) -> Tuple[List[str], List[str], str]:
+        """
+        Recorre el contenido una sola vez con el regex combinado y devuelve
+        (tags inline, wikilinks, contenido convertido). Con rewrite=True los
+        wikilinks se devuelven resueltos a su path (como en Note.links); con
+        rewrite=False se devuelve el texto del link tal cual, que es lo que
+        resuelve el grafo, y no se construye el contenido convertido ("").
+        
+        - ![[imagen]] → ![imagen](/assets/imagen)
+        - [[link|texto]] → [texto](/note/path/resuelto)
+        - #tag → tag inline
+        
+        Los #tags dentro de un (image) wikilink y el [[...]] interno de un
+        ![[...]] se siguen contando, como cuando cada cosa era una pasada aparte.
+        """
+        # Atajo: sin '[[' ni '#' no hay nada que extraer. `in` es una búsqueda
+        # en C (memchr) mucho más barata que recorrer el texto con el regex
+        if '[[' not in content and '#' not in content:
+            return [], [], content if rewrite else ""
+        
+        tags: List[str] = []
+        wikilinks: List[str] = []
+        pieces: List[str] = []
+        pos = 0
+        
+        for match in self.content_pattern.finditer(content):
+            tag = match.group('tag')
+            if tag is not None:
+                tags.append(tag)
+                continue
             
-            # Resolver el wikilink a su path completo
-            resolved_link = self._resolve_wikilink(link)
+            tags.extend(self.tag_pattern.findall(match.group(0)))
+            image_name = match.group('img')
             
-            # URL-encode cada segmento del path (preservando slashes)
-            encoded_path = '/'.join(quote(segment, safe='') for segment in resolved_link.split('/'))
+            if image_name is not None:
+                # El [[...]] de un ![[...]] también cuenta como wikilink
+                link, sep, alias = image_name.partition('|')
+                if link and (alias or not sep):
+                    wikilinks.append(self._resolve_wikilink(link) if rewrite else link)
+                
+                if rewrite:
+                    # Images are served from /assets endpoint
+                    encoded_name = quote(image_name, safe='')
+                    replacement = f'![{image_name}](/assets/{encoded_name})'
+            else:
+                link = match.group('wl')
+                
+                if not rewrite:
+                    # Texto del link sin resolver (ver docstring)
+                    wikilinks.append(link)
+                else:
+                    # Resolver el wikilink a su path completo
+                    resolved_link = self._resolve_wikilink(link)
+                    wikilinks.append(resolved_link)
+                    
+                    display_text = match.group('wltxt') or link
+                    # Path ya codificado si es una nota del vault; si no, codificar ahora
+                    encoded_path = self._note_encoded.get(resolved_link) or self._encode_path(resolved_link)
+                    # Convertir a formato que el frontend pueda manejar
+                    replacement = f'[{display_text}](/note/{encoded_path})'
             
-            # Convertir a formato que el frontend pueda manejar
-            return f'[{display_text}](/note/{encoded_path})'
-        
-        return self.wikilink_pattern.sub(replace_wikilink, content)
-    
-    def _convert_image_wikilinks(self, content: str) -> str:
-        """Convierte ![[image.jpg]] a formato markdown ![](url)"""
-        from urllib.parse import quote
+            if rewrite:
+                pieces.append(content[pos:match.start()])
+                pieces.append(replacement)
+                pos = match.end()
         
-        def replace_image(match):
-            image_name = match.group(1)
-            # Images are served from /assets endpoint
-            encoded_name = quote(image_name, safe='')
-            return f'![{image_name}](/assets/{encoded_name})'
+        if not rewrite:
+            return tags, wikilinks, ""
         
-        return self.image_wikilink_pattern.sub(replace_image, content)
+        pieces.append(content[pos:])
+        return tags, wikilinks, ''.join(pieces)
     
     def to_html(self, content: str) -> str:
         """Convierte markdown a HTML"""
-        return self.md.convert(content)
+        if self._md is None:
+            self._md = markdown.Markdown(extensions=['extra', 'codehilite', 'tables'])
+        # reset() entre documentos: footnotes, abreviaturas, etc. no se filtran
+        return self._md.reset().convert(content)
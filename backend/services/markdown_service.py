@@ -1,15 +1,48 @@
 import os
 import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Dict
-from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Dict, Tuple
+import orjson
 from git import Repo
+from rapidfuzz.utils import default_process
 from models.note import Note, NoteMetadata
-from services.markdown_parser import MarkdownParser
+from services.markdown_parser import MarkdownParser, _FM_RE
 from config.logging import get_logger
 
 logger = get_logger(__name__)
 
+# Sidecar con la metadata parseada del vault, reutilizada entre reinicios
+_SIDECAR_NAME = '.realm-keeper-cache.json'
+_SIDECAR_VERSION = 3
+
+# Wikilinks sin alias: [[link]] o [[link|title]] → "link"
+_WIKILINK_RE = re.compile(r'\[\[([^\]|]+)')
+
+
+def _iter_md(root: str) -> Iterator[os.DirEntry]:
+    """
+    Recorre el vault con os.scandir y devuelve los archivos .md. Las entradas
+    ocultas (.git, .obsidian...) se descartan antes de descender, y is_dir()
+    se responde desde la lectura del directorio, sin stat extra por archivo.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith('.md'):
+                        yield entry
+        except OSError as e:
+            logger.warning(f"Cannot scan {directory}: {e}")
+
 
 class MarkdownService:
     """Servicio para gestionar el vault de Markdown"""
@@ -20,12 +53,43 @@ class MarkdownService:
         self.ignore_tag = ignore_tag
         self.parser = MarkdownParser(vault_path=self.vault_path)
         
-        # Cache con TTL
-        self._cache: Dict[str, tuple] = {}  # {note_id: (Note, timestamp)}
-        self._cache_ttl: timedelta = timedelta(minutes=5)  # 5 minutos de TTL
+        # Cache de notas completas, válido mientras el archivo no cambie
+        self._cache: Dict[str, tuple] = {}  # {note_id: (Note, (mtime_ns, size))}
+        
+        # Títulos ya normalizados para búsqueda fuzzy {título: título procesado}
+        self._normalized_titles: Dict[str, str] = {}
+        # Columnas (notas, títulos procesados, índice de tags) de get_note_columns
+        self._columns_cache: Optional[Tuple[List[NoteMetadata], List[str], Dict[str, List[int]]]] = None
+        
+        # Resultados agregados memoizados por versión del vault; la versión se
+        # incrementa al invalidar todo el caché (sync del repositorio)
+        self._version: int = 0
+        # Prefijo del ETag único por proceso: la versión vuelve a 0 al reiniciar
+        self._etag_prefix: str = format(time.time_ns(), 'x')
+        self._tags_cache: Optional[Tuple[int, List[str]]] = None
+        self._graph_cache: Optional[Tuple[int, bytes]] = None
+        # Último scan del vault: (versión, notas, wikilinks), válido hasta que cambie un archivo
+        self._scan_cache: Optional[Tuple[int, List[NoteMetadata], Dict[str, List[str]]]] = None
+        
+        # Pool de threads para parsear el vault en paralelo. Es trabajo I/O-bound
+        # (las lecturas liberan el GIL): más threads que CPUs, con tope de 32
+        self._executor = ThreadPoolExecutor(
+            max_workers=min(32, (os.cpu_count() or 1) * 4),
+            thread_name_prefix="vault-scan",
+        )
         
         # Crear directorio si no existe
         self.vault_path.mkdir(parents=True, exist_ok=True)
+        
+        # Índice de wikilinks del parser, construido una vez (y tras cada sync)
+        md_files = self._walk_md()
+        self._refresh_note_index(md_files)
+        
+        # Metadata parseada por archivo, persistida entre reinicios en un sidecar
+        # {path relativo: ((mtime_ns, size), (NoteMetadata, wikilinks) o None)}
+        self._meta_cache: Dict[str, Tuple[Tuple[int, int], Optional[Tuple[NoteMetadata, List[str]]]]] = {}
+        self._sidecar_path = self.vault_path / _SIDECAR_NAME
+        self._load_sidecar()
     
     def sync_repository(self) -> bool:
         """Clona o actualiza el repositorio"""
@@ -50,7 +114,6 @@ class MarkdownService:
                     if files:
                         logger.info(f"Vault directory has {len(files)} files, will be replaced by clone")
                         # Eliminar archivos existentes para clonar limpio
-                        import shutil
                         for item in files:
                             if item.is_file():
                                 item.unlink()
@@ -66,7 +129,6 @@ class MarkdownService:
                     # Si falla con token, intentar sin token (por si es público)
                     logger.warning(f"Clone with token failed: {clone_error}")
                     # Extraer URL sin credenciales
-                    import re
                     url_without_token = re.sub(r'https://[^@]+@', 'https://', self.repo_url)
                     if url_without_token != self.repo_url:
                         logger.info(f"Retrying without token: {url_without_token}")
@@ -75,8 +137,9 @@ class MarkdownService:
                     else:
                         raise
             
-            # Invalidar cache después de sync
+            # Invalidar cache y reconstruir el índice de wikilinks después de sync
             self.invalidate_cache()
+            self._refresh_note_index(self._walk_md())
             return True
         except Exception as e:
             logger.error(f"Error syncing repository: {e}", exc_info=True)
@@ -84,66 +147,232 @@ class MarkdownService:
     
     def get_all_notes(self) -> List[NoteMetadata]:
         """Obtiene metadata de todas las notas manteniendo estructura de directorios"""
+        return self._get_scan()[1]
+    
+    def get_all_links(self) -> Dict[str, List[str]]:
+        """
+        Obtiene los wikilinks de todas las notas en una sola pasada.
+        
+        Returns:
+            Dict {note_id: [wikilinks]} para cada nota no ignorada, con el
+            texto de cada link sin resolver (el grafo lo resuelve por id o título)
+        """
+        return self._get_scan()[2]
+    
+    def _get_scan(self) -> Tuple[int, List[NoteMetadata], Dict[str, List[str]]]:
+        """
+        Resultado de _scan_notes como (versión, notas, wikilinks), cacheado
+        mientras ningún archivo del vault cambie. Cada llamada cuesta un
+        recorrido y un stat por archivo: si alguna nota se creó, cambió o
+        desapareció (también en subcarpetas) se incrementa la versión para que
+        tags, grafo y ETags se regeneren. Hacer una sola llamada por request y
+        derivar de ella el ETag y la respuesta.
+        """
+        changed = self._scan_notes()
+        cached = self._scan_cache
+        if cached is not None and not changed:
+            return cached
+        if cached is not None:
+            self._version += 1
+        
         notes = []
+        links_map: Dict[str, List[str]] = {}
         
-        for md_file in self.vault_path.rglob('*.md'):
-            # Ignorar archivos en .git u otras carpetas ocultas
-            if any(part.startswith('.') for part in md_file.parts):
+        for _, result in self._meta_cache.values():
+            if result is None:
                 continue
-            
-            # Path relativo al vault (mantiene estructura de directorios)
-            relative_path = md_file.relative_to(self.vault_path)
-            note_id = str(relative_path.with_suffix(''))
-            
+            note_meta, links = result
+            links_map[note_meta.id] = links
+            notes.append(note_meta)
+        
+        self._scan_cache = (self._version, sorted(notes, key=lambda x: x.path), links_map)
+        return self._scan_cache
+    
+    def _scan_notes(self) -> bool:
+        """
+        Recorre el vault y actualiza la metadata de las notas junto con sus
+        wikilinks, extraídos del mismo parse. Cada archivo cuesta un stat:
+        solo se parsean (en paralelo en el pool de threads del servicio) los
+        que cambiaron de mtime o tamaño desde el último scan o desde el sidecar.
+        
+        Returns:
+            True si algún archivo se parseó de nuevo o dejó de existir
+        """
+        md_files = self._walk_md()
+        
+        previous = self._meta_cache
+        entries: Dict[str, Tuple[Tuple[int, int], Optional[Tuple[NoteMetadata, List[str]]]]] = {}
+        misses: List[Tuple[str, str]] = []
+        signatures: List[Tuple[int, int]] = []
+        
+        for md_file in md_files:
+            file_path, relative_path = md_file
             try:
-                # Parse solo para metadata
-                fm, content, tags, _ = self.parser.parse_file(md_file)
-                
-                # Título desde frontmatter o nombre del archivo
-                title = fm.get('title', md_file.stem)
-                note_type = fm.get('type', None)
-                
-                # Skip notes with ignored tag
-                if self.ignore_tag and self.ignore_tag in tags:
-                    continue
-                
-                notes.append(NoteMetadata(
-                    id=note_id.replace('\\', '/'),  # Normalizar a forward slashes
-                    title=title,
-                    path=str(relative_path).replace('\\', '/'),
-                    tags=tags,
-                    type=note_type
-                ))
-            except Exception as e:
-                logger.error(f"Error processing {md_file}: {e}", exc_info=True)
+                st = os.stat(file_path)
+            except OSError:
                 continue
+            signature = (st.st_mtime_ns, st.st_size)
+            
+            cached = previous.get(relative_path)
+            if cached is not None and cached[0] == signature:
+                entries[relative_path] = cached
+            else:
+                misses.append(md_file)
+                signatures.append(signature)
+        
+        for md_file, signature, result in zip(
+            misses, signatures, self._executor.map(self._parse_note_metadata, misses)
+        ):
+            entries[md_file[1]] = (signature, result)
+        
+        self._meta_cache = entries
+        changed = bool(misses) or len(entries) != len(previous)
+        if changed:
+            self._save_sidecar()
+        
+        return changed
+    
+    def _load_sidecar(self) -> None:
+        """Cargar la metadata persistida si corresponde al vault actual"""
+        try:
+            data = orjson.loads(self._sidecar_path.read_bytes())
+            # Lo único que no se refleja en el (mtime, size) de cada archivo es
+            # ignore_tag: los wikilinks se guardan sin resolver contra el índice
+            if data.get('version') != _SIDECAR_VERSION or data.get('ignore_tag') != self.ignore_tag:
+                logger.info("Metadata cache sidecar is stale, ignoring it")
+                return
+            
+            entries = {}
+            for relative_path, (mtime_ns, size, meta, links) in data['notes'].items():
+                result = (NoteMetadata(**meta), links) if meta is not None else None
+                entries[relative_path] = ((mtime_ns, size), result)
+            self._meta_cache = entries
+            logger.info(f"Loaded metadata cache sidecar with {len(entries)} entries")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable metadata cache sidecar: {e}")
+    
+    def _save_sidecar(self) -> None:
+        """Reescribir el sidecar de forma atómica (archivo temporal + os.replace)"""
+        notes = {
+            relative_path: [
+                signature[0],
+                signature[1],
+                result[0].model_dump() if result is not None else None,
+                result[1] if result is not None else [],
+            ]
+            for relative_path, (signature, result) in self._meta_cache.items()
+        }
+        payload = orjson.dumps({'version': _SIDECAR_VERSION, 'ignore_tag': self.ignore_tag, 'notes': notes})
+        
+        tmp_path = self._sidecar_path.with_name(f"{_SIDECAR_NAME}.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_bytes(payload)
+            os.replace(tmp_path, self._sidecar_path)
+        except OSError as e:
+            logger.warning(f"Could not write metadata cache sidecar: {e}")
+    
+    def _walk_md(self) -> List[Tuple[str, str]]:
+        """
+        Archivos .md del vault como (path absoluto, path relativo con '/').
+        El path relativo sale de recortar el string, sin Path.relative_to.
+        """
+        root = str(self.vault_path)
+        prefix_len = len(os.path.join(root, ''))
+        return [
+            (entry.path, entry.path[prefix_len:].replace('\\', '/'))
+            for entry in _iter_md(root)
+        ]
+    
+    def _refresh_note_index(self, md_files: List[Tuple[str, str]]) -> None:
+        """
+        Construye el índice nombre de archivo -> path completo a partir de un
+        recorrido ya hecho del vault y se lo pasa al parser para resolver wikilinks.
+        """
+        note_index: Dict[str, str] = {}
+        note_index_lower: Dict[str, str] = {}
+        
+        for _, relative_path in md_files:
+            # Path relativo sin extensión
+            resolved_path = relative_path[:-3]
+            # Nombre del archivo sin extensión
+            filename = resolved_path.rpartition('/')[2]
+            
+            # Guardar tanto el nombre simple como el path completo (case-sensitive)
+            note_index[filename] = resolved_path
+            note_index[resolved_path] = resolved_path
+            
+            # También en minúsculas para búsqueda case-insensitive
+            note_index_lower[filename.lower()] = resolved_path
+            note_index_lower[resolved_path.lower()] = resolved_path
         
-        return sorted(notes, key=lambda x: x.path)
+        self.parser.set_note_index(note_index, note_index_lower)
     
-    def _is_cache_valid(self, cached_at: datetime) -> bool:
-        """Verificar si entrada de caché sigue siendo válida"""
-        return datetime.now() - cached_at < self._cache_ttl
+    def _parse_note_metadata(self, md_file: Tuple[str, str]) -> Optional[Tuple[NoteMetadata, List[str]]]:
+        """
+        Parsea un archivo (path absoluto, path relativo) y devuelve
+        (metadata, wikilinks), o None si la nota está ignorada o no se pudo procesar.
+        """
+        # Path relativo al vault (mantiene estructura de directorios)
+        file_path, relative_path = md_file
+        note_id = relative_path[:-3]
+        
+        try:
+            # Parse liviano para metadata y wikilinks (sin convertir contenido).
+            # Skip notes with ignored tag: el parser las descarta antes de
+            # extraer tags y wikilinks
+            parsed = self.parser.parse_file_meta_only(file_path, ignore_tag=self.ignore_tag)
+            if parsed is None:
+                return None
+            fm, tags, wikilinks = parsed
+            
+            # Título desde frontmatter o nombre del archivo
+            title = fm.get('title', note_id.rpartition('/')[2])
+            note_type = fm.get('type', None)
+            
+            links = [link.strip() for link in wikilinks if link.strip()]
+            return NoteMetadata(
+                id=note_id,
+                title=title,
+                path=relative_path,
+                tags=tags,
+                type=note_type
+            ), links
+        except Exception as e:
+            logger.error(f"Error processing {file_path}: {e}", exc_info=True)
+            return None
+    
+    @staticmethod
+    def _file_signature(file_path: Path) -> Optional[Tuple[int, int]]:
+        """(mtime_ns, size) del archivo, o None si no existe"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
     
     def get_note(self, note_id: str) -> Optional[Note]:
-        """Obtiene una nota específica por su ID (path relativo) con caché con TTL"""
+        """
+        Obtiene una nota específica por su ID (path relativo). Queda en caché
+        mientras el archivo no cambie de mtime ni tamaño (un stat por lectura).
+        """
         # Normalizar el note_id
         note_id = note_id.replace('/', os.sep)
         
-        # Revisar cache
-        if note_id in self._cache:
-            note, cached_at = self._cache[note_id]
-            if self._is_cache_valid(cached_at):
-                return note
-            else:
-                # Invalidar entrada expirada
-                del self._cache[note_id]
-        
         # Construir path completo
         note_path = self.vault_path / f"{note_id}.md"
         
-        if not note_path.exists():
+        signature = self._file_signature(note_path)
+        if signature is None:
+            self._cache.pop(note_id, None)
             return None
         
+        # Revisar cache
+        cached = self._cache.get(note_id)
+        if cached is not None and cached[1] == signature:
+            return cached[0]
+        
         try:
             fm, content, tags, notelinks = self.parser.parse_file(note_path)
             
@@ -159,8 +388,8 @@ class MarkdownService:
                 links=notelinks
             )
             
-            # Guardar en caché con timestamp
-            self._cache[note_id] = (note, datetime.now())
+            # Guardar en caché con la firma del archivo
+            self._cache[note_id] = (note, signature)
             return note
             
         except Exception as e:
@@ -177,55 +406,197 @@ class MarkdownService:
         else:
             # Invalidar todo el caché
             self._cache.clear()
+            self._meta_cache = {}
+            self._scan_cache = None
+            self._sidecar_path.unlink(missing_ok=True)
+            self._normalized_titles.clear()
+            self._columns_cache = None
+            self._version += 1
             logger.debug("Cleared entire cache")
     
+    def get_note_columns(self) -> Tuple[str, List[NoteMetadata], List[str], Dict[str, List[int]]]:
+        """
+        Devuelve el ETag y las notas junto con columnas precalculadas para
+        filtrar por índice sin recorrer cada NoteMetadata: títulos procesados
+        para búsqueda fuzzy (minúsculas, sin puntuación) y un índice invertido
+        {tag en minúsculas: posiciones de las notas en orden}. ETag y columnas
+        salen del mismo scan. Las columnas se reutilizan mientras el scan
+        devuelva la misma lista, y cada título se procesa una sola vez hasta
+        que se invalide el caché.
+        """
+        version, notes, _ = self._get_scan()
+        etag = self._etag_for(version)
+        cached = self._columns_cache
+        if cached is not None and cached[0] is notes:
+            return (etag, *cached)
+        
+        normalized = self._normalized_titles
+        titles = []
+        tag_index: Dict[str, List[int]] = {}
+        for i, note in enumerate(notes):
+            processed = normalized.get(note.title)
+            if processed is None:
+                processed = normalized[note.title] = default_process(note.title)
+            titles.append(processed)
+            
+            for tag in note.tag_set:
+                tag_index.setdefault(tag, []).append(i)
+        
+        columns = (notes, titles, tag_index)
+        self._columns_cache = columns
+        return (etag, *columns)
+    
+    @property
+    def version(self) -> int:
+        """
+        Versión del contenido del vault, cambia con cada invalidación total o
+        cuando se crea, modifica o borra cualquier nota (un stat por archivo)
+        """
+        return self._get_scan()[0]
+    
+    @property
+    def etag(self) -> str:
+        """ETag débil derivado de la versión del vault (para If-None-Match)"""
+        return self._etag_for(self.version)
+    
+    def _etag_for(self, version: int) -> str:
+        """ETag débil de una versión ya obtenida de _get_scan"""
+        return f'W/"{self._etag_prefix}-{version}"'
+    
     def get_all_tags(self) -> List[str]:
         """Obtiene todos los tags únicos del vault ordenados alfabéticamente"""
+        version, notes, _ = self._get_scan()
+        if self._tags_cache and self._tags_cache[0] == version:
+            return self._tags_cache[1]
+        
         tags = set()
         
-        for note_meta in self.get_all_notes():
+        for note_meta in notes:
             tags.update(note_meta.tags)
         
-        return sorted(list(tags), key=str.lower)
+        result = sorted(list(tags), key=str.lower)
+        self._tags_cache = (version, result)
+        return result
+    
+    def get_graph_json(self) -> Tuple[str, bytes]:
+        """
+        Devuelve el ETag y el grafo completo (nodos y wikilinks) ya serializado
+        a JSON, ambos del mismo scan. Se recalcula solo cuando cambia la
+        versión del vault.
+        """
+        version, notes_metadata, links_map = self._get_scan()
+        etag = self._etag_for(version)
+        if self._graph_cache and self._graph_cache[0] == version:
+            return etag, self._graph_cache[1]
+        
+        payload = orjson.dumps(self._build_graph_data(notes_metadata, links_map))
+        self._graph_cache = (version, payload)
+        return etag, payload
+    
+    def _build_graph_data(
+        self, notes_metadata: List[NoteMetadata], links_map: Dict[str, List[str]]
+    ) -> Dict:
+        """
+        Construye los datos del grafo de todas las notas y sus wikilinks a
+        partir de un scan ya hecho. Los wikilinks salen del mismo parse que la
+        metadata (sin releer archivos).
+        """
+        
+        # Create nodes and build lookup maps
+        nodes = []
+        node_ids = set()  # Set de IDs (paths)
+        title_to_id = {}  # Map de título a ID para resolver wikilinks
+        title_lower_to_id = {}  # Igual pero en minúsculas (gana la primera nota)
+        
+        for note_meta in notes_metadata:
+            node_ids.add(note_meta.id)
+            # Map título a ID para resolver wikilinks por título
+            title_to_id[note_meta.title] = note_meta.id
+            title_lower_to_id.setdefault(note_meta.title.lower(), note_meta.id)
+            
+            nodes.append({
+                "id": note_meta.id,
+                "title": note_meta.title,
+                "path": note_meta.id,
+                "tags": note_meta.tags,
+                "type": note_meta.type
+            })
+        
+        # Resolve links (already extracted by the scan, no extra file reads).
+        # Las aristas se deduplican como tuplas en un dict (conserva el orden de
+        # inserción, a diferencia de un set) y los dicts de salida se crean al final
+        edges = {}
+        
+        for note_meta in notes_metadata:
+            source_id = note_meta.id
+            for link in links_map[source_id]:
+                # Intentar resolver el link de 3 formas:
+                # 1. Directo por ID
+                # 2. Por título exacto
+                # 3. Por título case-insensitive
+                if link in node_ids:
+                    # Match directo con ID
+                    target_id = link
+                elif link in title_to_id:
+                    # Match con título exacto
+                    target_id = title_to_id[link]
+                else:
+                    # Buscar por coincidencia de título (case-insensitive)
+                    target_id = title_lower_to_id.get(link.lower())
+                
+                # Create link si el target existe
+                if target_id:
+                    edges[source_id, target_id] = None
+        
+        links = [{"source": source, "target": target} for source, target in edges]
+        
+        logger.info(f"Graph data generated: {len(nodes)} nodes, {len(links)} links")
+        
+        return {
+            "nodes": nodes,
+            "links": links
+        }
     
     def get_note_links_only(self, note_id: str) -> List[str]:
         """
         Extrae links (wikilinks) de una nota sin cargar el contenido completo.
-        Más eficiente que get_note() cuando solo necesitas los links.
+        Más eficiente que get_note() cuando solo necesitas los links; si la
+        nota ya está en caché se devuelven sus links sin tocar el disco.
         
         Args:
             note_id: ID de la nota (path relativo)
             
         Returns:
-            Lista de wikilinks encontrados en la nota
+            Lista de wikilinks encontrados en la nota, resueltos a su path
+            como en Note.links
         """
         note_id_normalized = note_id.replace('/', os.sep)
         note_path = self.vault_path / f"{note_id_normalized}.md"
         
-        if not note_path.exists():
+        signature = self._file_signature(note_path)
+        if signature is None:
             return []
         
+        # Nota ya parseada y sin cambios en caché: sus links ya están extraídos
+        cached = self._cache.get(note_id_normalized)
+        if cached is not None and cached[1] == signature:
+            return list(cached[0].links)
+        
         try:
-            content = note_path.read_text(encoding='utf-8')
+            data = note_path.read_bytes()
             
-            # Skip frontmatter (si empieza con ---)
-            if content.startswith('---'):
-                # Encontrar el segundo --- que cierra el frontmatter
-                parts = content.split('---', 2)
-                if len(parts) >= 3:
-                    content = parts[2]
+            # Skip frontmatter: el regex sobre bytes da el offset donde termina
+            # y solo se decodifica el resto (sin copias intermedias del archivo)
+            match = _FM_RE.match(data)
+            start = match.end() if match else 0
+            content = data[start:].decode('utf-8', errors='replace')
             
             # Extraer wikilinks: [[link]] o [[link|title]]
-            wikilinks = re.findall(r'\[\[([^\]|]+)', content)
-            
-            # Limpiar y normalizar links (remover espacios y normalizar separadores)
-            cleaned_links = []
-            for link in wikilinks:
-                link = link.strip()
-                if link:
-                    cleaned_links.append(link)
+            wikilinks = _WIKILINK_RE.findall(content)
             
-            return cleaned_links
+            # Limpiar links (remover espacios) y resolverlos como en Note.links
+            resolve = self.parser.resolve_wikilink
+            return [resolve(link) for link in map(str.strip, wikilinks) if link]
             
         except Exception as e:
             logger.warning(f"Error reading links from {note_id}: {e}")
@@ -0,0 +1,52 @@
+"""
+Tests del parser de markdown: conversión de (image) wikilinks y extracción
+de tags y wikilinks en la pasada única de _scan_content
+"""
+
+import unittest
+
+from services.markdown_parser import MarkdownParser
+
+
+class ScanContentTests(unittest.TestCase):
+    def setUp(self):
+        self.parser = MarkdownParser()
+    
+    def test_stray_brackets_do_not_swallow_image_embed(self):
+        # Un '[[' suelto antes de un ![[...]] no debe convertirse en link a nota
+        content = "Type [[ to start a link.\n\n![[map.png]]\n"
+        tags, wikilinks, converted = self.parser._scan_content(content, rewrite=True)
+        
+        self.assertEqual(converted, "Type [[ to start a link.\n\n![map.png](/assets/map.png)\n")
+        self.assertEqual(wikilinks, ["map.png"])
+        self.assertEqual(tags, [])
+    
+    def test_empty_embed_is_not_an_image(self):
+        # '![[]]' no es una imagen, así que el wikilink puede contenerlo
+        _, wikilinks, converted = self.parser._scan_content("[[ [![[]]", rewrite=True)
+        
+        self.assertEqual(converted, "[ [![[](/note/%20%5B%21%5B%5B)")
+        self.assertEqual(wikilinks, [" [![["])
+    
+    def test_images_links_and_tags(self):
+        content = "See [[Weiss|the mayor]] and [[Town Hall]] #lore\n![[map.png]]"
+        tags, wikilinks, converted = self.parser._scan_content(content, rewrite=True)
+        
+        self.assertEqual(
+            converted,
+            "See [the mayor](/note/Weiss) and [Town Hall](/note/Town%20Hall) #lore\n"
+            "![map.png](/assets/map.png)",
+        )
+        self.assertEqual(wikilinks, ["Weiss", "Town Hall", "map.png"])
+        self.assertEqual(tags, ["lore"])
+    
+    def test_meta_scan_keeps_raw_link_text(self):
+        self.parser.set_note_index({"Weiss": "People/Weiss"}, {"weiss": "People/Weiss"})
+        _, wikilinks, converted = self.parser._scan_content("[[Weiss]]", rewrite=False)
+        
+        self.assertEqual(wikilinks, ["Weiss"])
+        self.assertEqual(converted, "")
+
+
+if __name__ == "__main__":
+    unittest.main()